@@ -0,0 +1,259 @@
+import atexit
+import queue
+import re
+import threading
+import time
+from datetime import date, datetime, timezone
+
+from psycopg2 import errorcodes
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError, ProgrammingError, SQLAlchemyError
+
+from init import db
+from models.activity import Activity
+
+# Sentinel put on the queue to tell the writer thread to stop
+_STOP = object()
+
+# activities_yYYYYmMM, the only children of activities this module manages
+PARTITION_NAME = re.compile(rf"^{Activity.__tablename__}_y(\d{{4}})m(\d{{2}})$")
+
+def utc_now():
+    # naive UTC, the same clock created_at is stamped with
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def month_start(value):
+    # first day of the month that value falls in
+    return date(value.year, value.month, 1)
+
+def next_month(value):
+    # first day of the month after value
+    if value.month == 12:
+        return date(value.year + 1, 1, 1)
+    return date(value.year, value.month + 1, 1)
+
+def partition_name(month):
+    return f"{Activity.__tablename__}_y{month.year}m{month.month:02d}"
+
+def ensure_partition(month):
+    # CREATE TABLE IF NOT EXISTS activities_yYYYYmMM PARTITION OF activities ...
+    # in a transaction of its own, never together with an insert
+    month = month_start(month)
+    try:
+        db.session.execute(db.text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+            f"PARTITION OF {Activity.__tablename__} "
+            f"FOR VALUES FROM ('{month.isoformat()}') TO ('{next_month(month).isoformat()}')"
+        ))
+        db.session.commit()
+    except (IntegrityError, ProgrammingError) as err:
+        db.session.rollback()
+        # IF NOT EXISTS is not race safe: another process may have created
+        # the partition between our check and our create
+        if err.orig.pgcode not in (errorcodes.DUPLICATE_TABLE, errorcodes.UNIQUE_VIOLATION):
+            raise
+
+def ensure_partitions(day=None):
+    # create the partitions for the current and the next month, so events
+    # never wait on a partition being created when the month rolls over
+    month = month_start(day or utc_now())
+    months = [month, next_month(month)]
+    for month in months:
+        ensure_partition(month)
+    return months
+
+def drop_partitions_before(month):
+    month = month_start(month)
+    # never drop the current month's partition or the one created ahead of it
+    if month > month_start(utc_now()):
+        raise ValueError("Cannot drop partitions of the current or a future month")
+    # find every partition of the activities table
+    stmt = db.text(
+        "SELECT n.nspname, c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE i.inhparent = CAST(:parent AS regclass)"
+    )
+    rows = db.session.execute(stmt, {"parent": Activity.__tablename__}).all()
+    # drop the monthly partitions that only hold events older than month
+    dropped = []
+    for schema, name in rows:
+        match = PARTITION_NAME.match(name)
+        if match and date(int(match[1]), int(match[2]), 1) < month:
+            db.session.execute(db.text(f'DROP TABLE IF EXISTS "{schema}"."{name}"'))
+            dropped.append(name)
+    db.session.commit()
+    return dropped
+
+def snapshot(obj, fields):
+    return {field: getattr(obj, field) for field in fields}
+
+def diff(before, after):
+    # only keep the fields whose value actually changed
+    return {
+        field: {"old": before[field], "new": after[field]}
+        for field in before
+        if before[field] != after[field]
+    }
+
+class ActivityLog:
+    """
+    Queues activity events and writes them to the database in batches.
+
+    Controllers call record() after their own commit, which only puts the
+    event on an in-memory queue. A background thread collects events for up
+    to flush_interval seconds (or until batch_size is reached) and inserts
+    them with one statement per batch, so the audit log never adds a
+    database round trip to the request that caused it.
+
+    A batch that fails on a lost or invalidated connection is retried with
+    backoff; any other error loses the batch straight away. The queue holds
+    at most queue_size events, and events recorded while it is full are
+    dropped and logged. On exit, the writer stops retrying and gets
+    shutdown_timeout seconds to write what is still queued.
+    """
+
+    def __init__(self, batch_size=100, flush_interval=1.0, max_retries=5, retry_backoff=0.5,
+                 queue_size=10000, shutdown_timeout=10.0):
+        self.app = None
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.shutdown_timeout = shutdown_timeout
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._partitions = set()
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config.get("ACTIVITY_BATCH_SIZE", self.batch_size)
+        self.flush_interval = app.config.get("ACTIVITY_FLUSH_INTERVAL", self.flush_interval)
+        self.max_retries = app.config.get("ACTIVITY_MAX_RETRIES", self.max_retries)
+        self.retry_backoff = app.config.get("ACTIVITY_RETRY_BACKOFF", self.retry_backoff)
+        self.shutdown_timeout = app.config.get("ACTIVITY_SHUTDOWN_TIMEOUT", self.shutdown_timeout)
+        self._queue = queue.Queue(maxsize=app.config.get("ACTIVITY_QUEUE_SIZE", self._queue.maxsize))
+        app.extensions["activity_log"] = self
+        # write whatever is still queued when the process exits
+        atexit.register(self.shutdown)
+
+    def record(self, action, entity, entity_id, user_id=None, card_id=None, changes=None):
+        self._start()
+        try:
+            self._queue.put_nowait({
+                "created_at": utc_now(),
+                "user_id": int(user_id) if user_id is not None else None,
+                "action": action,
+                "entity": entity,
+                "entity_id": entity_id,
+                "card_id": card_id,
+                "changes": changes,
+            })
+        except queue.Full:
+            # never block the request on the audit log
+            self.app.logger.error("Activity queue is full, dropped %s %s %s", action, entity, entity_id)
+
+    def shutdown(self):
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread and thread.is_alive():
+            # stop retrying, and give the writer a bounded time to finish
+            self._stopping.set()
+            deadline = time.monotonic() + self.shutdown_timeout
+            try:
+                self._queue.put(_STOP, timeout=self.shutdown_timeout)
+            except queue.Full:
+                pass
+            thread.join(max(deadline - time.monotonic(), 0))
+            if thread.is_alive():
+                self.app.logger.error(
+                    "Activity writer did not finish in %ss, unwritten events are lost (%d still queued)",
+                    self.shutdown_timeout, self._queue.qsize()
+                )
+
+    def _start(self):
+        # the thread is started lazily so that CLI commands and the
+        # reloader's parent process never spawn a writer
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopping.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="activity-log-writer", daemon=True
+                )
+                self._thread.start()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._drain()
+            if batch:
+                self._write(batch)
+
+    def _drain(self):
+        # block until the first event arrives, then keep collecting until
+        # the batch is full or flush_interval has passed
+        item = self._queue.get()
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while item is not _STOP:
+            batch.append(item)
+            remaining = deadline - time.monotonic()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                return batch, False
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                return batch, False
+        return batch, True
+
+    def _ensure_partitions(self, batch):
+        # partitions are created a month ahead, so this only runs DDL once
+        # per month per process, and normally well before the rollover
+        months = set()
+        for event in batch:
+            month = month_start(event["created_at"])
+            months |= {month, next_month(month)}
+        for month in sorted(months - self._partitions):
+            ensure_partition(month)
+            self._partitions.add(month)
+
+    def _write(self, batch):
+        with self.app.app_context():
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._ensure_partitions(batch)
+                    db.session.execute(db.insert(Activity), batch)
+                    db.session.commit()
+                    return
+                except SQLAlchemyError as err:
+                    db.session.rollback()
+                    # a partition may have been dropped behind our back, so
+                    # check them all again on the next write
+                    self._partitions.clear()
+                    if (attempt == self.max_retries or not self._is_transient(err)
+                            or self._stopping.is_set()):
+                        self.app.logger.exception(
+                            "Lost %d activity events after %d attempts", len(batch), attempt + 1
+                        )
+                        return
+                    self.app.logger.warning(
+                        "Failed to write %d activity events, retrying", len(batch), exc_info=True
+                    )
+                    # wakes up early if the process is shutting down
+                    if self._stopping.wait(self.retry_backoff * 2 ** attempt):
+                        self.app.logger.error("Lost %d activity events on shutdown", len(batch))
+                        return
+                finally:
+                    db.session.remove()
+
+    @staticmethod
+    def _is_transient(err):
+        # only a lost connection is worth retrying, anything else
+        # (bad data, constraint violations) fails the same way every time
+        if isinstance(err, OperationalError):
+            return True
+        return isinstance(err, DBAPIError) and err.connection_invalidated
+
+activity_log = ActivityLog()
@@ -5,6 +5,7 @@ from flask import Blueprint, request
 from models.user import User, user_schema, UserSchema
 from init import bcrypt, db
 from utils import auth_as_admin_decorator
+from activity_log import activity_log, snapshot, diff
 
 from sqlalchemy.exc import IntegrityError
 from psycopg2 import errorcodes
@@ -28,7 +29,10 @@ def register_user():
             user.password = bcrypt.generate_password_hash(password).decode("utf-8")
         # Add and commit to the DB
         db.session.add(user)
+        changes = snapshot(user, ("name", "email"))
         db.session.commit()
+        # queue the activity event, the new user is the one acting
+        activity_log.record("create", "user", user.id, user_id=user.id, changes=changes)
         # Return acknowledgement
         return user_schema.dump(user), 201
     except IntegrityError as err:
@@ -69,12 +73,21 @@ def update_user():
     user = db.session.scalar(stmt)
     # if exists:
     if user:
+        # keep the old values for the activity log
+        before = snapshot(user, ("name",))
         # update the fields as required
         user.name = body_data.get("name") or user.name
         if password:
             user.password = bcrypt.generate_password_hash(password).decode("utf-8")
+        # never log the password itself
+        changes = diff(before, snapshot(user, ("name",)))
+        if password:
+            changes["password"] = "changed"
         # commit to the DB
         db.session.commit()
+        # queue the activity event if the name or password changed
+        if changes:
+            activity_log.record("update", "user", user.id, user_id=user.id, changes=changes)
         # return a response
         return user_schema.dump(user)
     # else:
@@ -94,8 +107,11 @@ def delete_user(user_id):
     # if exists:
     if user:
         # delete the user
+        changes = snapshot(user, ("name", "email", "is_admin"))
         db.session.delete(user)
         db.session.commit()
+        # queue the activity event with a snapshot of the deleted user
+        activity_log.record("delete", "user", user_id, user_id=get_jwt_identity(), changes=changes)
         # return an acknowledgement message
         return {"message": f"User with id {user_id} is deleted."}
     # else:
@@ -5,6 +5,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 
 from init import db
 from models.card import Card, card_schema, cards_schema
+from models.activity import Activity, activities_schema
+from activity_log import activity_log, snapshot, diff
 
 from controllers.comment_controller import comments_bp
 from utils import auth_as_admin_decorator
@@ -19,6 +21,10 @@ cards_bp.register_blueprint(comments_bp)
 # /cards - POST - create a new card
 # /cards/<id> - DELETE - delete a card
 # /cards/<id> - PUT, PATCH - edit a card entry
+# /cards/<id>/activity - GET - fetch the history of a card
+
+# Fields of a card that are tracked in the activity log
+CARD_FIELDS = ("title", "description", "status", "priority")
 
 # /cards - GET - fetch all cards
 @cards_bp.route("/")
@@ -55,7 +61,10 @@ def create_card():
     )
     # add and commit to the DB
     db.session.add(card)
+    changes = snapshot(card, CARD_FIELDS)
     db.session.commit()
+    # queue the activity event
+    activity_log.record("create", "card", card.id, user_id=get_jwt_identity(), card_id=card.id, changes=changes)
     # response message
     return card_schema.dump(card)
 
@@ -77,8 +86,11 @@ def delete_card(card_id):
     # if card exists
     if card:
         # delete the card
+        changes = snapshot(card, CARD_FIELDS)
         db.session.delete(card)
         db.session.commit()
+        # queue the activity event with a snapshot of the deleted card
+        activity_log.record("delete", "card", card_id, user_id=get_jwt_identity(), card_id=card_id, changes=changes)
         return {"message": f"Card {card.title} deleted successfully!"}
     # else
     else:
@@ -104,16 +116,39 @@ def update_card(card_id):
     #         # return error message
     #         return {"error": "Cannot perform this operation. Only owners are allowed to execute this operation."}
 
+        # keep the old values for the activity log
+        before = snapshot(card, CARD_FIELDS)
         # update the fields as required
         card.title = body_data.get("title") or card.title
         card.description = body_data.get("description") or card.description
         card.status = body_data.get("status") or card.status
         card.priority = body_data.get("priority") or card.priority
+        changes = diff(before, snapshot(card, CARD_FIELDS))
         # commit to the DB
         db.session.commit()
+        # queue the activity event with the changed fields, if any
+        if changes:
+            activity_log.record("update", "card", card_id, user_id=get_jwt_identity(), card_id=card_id, changes=changes)
         # return acknowledgement
         return card_schema.dump(card)
     # else
     else:
         # return error message
-        return {"error": f"Card with id {card_id} not found."}, 404
\ No newline at end of file
+        return {"error": f"Card with id {card_id} not found."}, 404
+
+# /cards/<id>/activity - GET - fetch the history of a card
+@cards_bp.route("/<int:card_id>/activity")
+@jwt_required()
+def get_card_activity(card_id):
+    # events of deleted cards are kept, so the card itself is not looked up
+    # SELECT * FROM activities WHERE card_id=card_id ORDER BY created_at DESC, id DESC
+    stmt = db.select(Activity).filter_by(card_id=card_id).order_by(Activity.created_at.desc(), Activity.id.desc())
+    # ?page=<n>&per_page=<n>, per_page is capped at 100
+    page = db.paginate(stmt, max_per_page=100, error_out=False)
+    return {
+        "activity": activities_schema.dump(page.items),
+        "page": page.page,
+        "per_page": page.per_page,
+        "total": page.total,
+        "pages": page.pages
+    }
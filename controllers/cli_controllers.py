@@ -1,16 +1,20 @@
 from datetime import date
 
+import click
 from flask import Blueprint
 from init import db, bcrypt
 from models.user import User
 from models.card import Card
 from models.comment import Comment
+from activity_log import ensure_partitions, drop_partitions_before
 
 db_commands = Blueprint("db", __name__)
 
 @db_commands.cli.command("create")
 def create_tables():
     db.create_all()
+    # the activity log needs partitions for the current and next month
+    ensure_partitions()
     print("Tables created!")
 
 @db_commands.cli.command("seed")
@@ -88,4 +92,14 @@ def seed_tables():
 @db_commands.cli.command("drop")
 def drop_tables():
     db.drop_all()
-    print("Tables droppped.")
\ No newline at end of file
+    print("Tables droppped.")
+
+@db_commands.cli.command("drop-activity")
+@click.argument("month", type=click.DateTime(formats=["%Y-%m"]))
+def drop_activity(month):
+    # drop the activity partitions older than MONTH, given as YYYY-MM
+    try:
+        dropped = drop_partitions_before(month.date())
+    except ValueError as err:
+        raise click.BadParameter(str(err), param_hint="MONTH")
+    print(f"Dropped {len(dropped)} activity partitions.")
\ No newline at end of file
@@ -6,6 +6,7 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from init import db
 from models.comment import Comment, comment_schema, comments_schema
 from models.card import Card
+from activity_log import activity_log, snapshot, diff
 
 comments_bp = Blueprint("comments", __name__, url_prefix="/<int:card_id>/comments")
 
@@ -31,7 +32,10 @@ def create_comment(card_id):
         )
         # add and commit the session
         db.session.add(comment)
+        changes = snapshot(comment, ("message",))
         db.session.commit()
+        # queue the activity event
+        activity_log.record("create", "comment", comment.id, user_id=get_jwt_identity(), card_id=card_id, changes=changes)
         # return acknowledgement
         return comment_schema.dump(comment), 201
     # else
@@ -49,8 +53,11 @@ def delete_comment(card_id, comment_id):
     # if exists:
     if comment:
         # delete
+        changes = snapshot(comment, ("message",))
         db.session.delete(comment)
         db.session.commit()
+        # queue the activity event with a snapshot of the deleted comment
+        activity_log.record("delete", "comment", comment_id, user_id=get_jwt_identity(), card_id=comment.card_id, changes=changes)
         # return acknowledgement message
         return {"message": f"Comment '{comment.message}' deleted successfully."}
     # else:
@@ -70,10 +77,16 @@ def update_comment(card_id, comment_id):
     comment = db.session.scalar(stmt)
     # if exists:
     if comment:
+        # keep the old message for the activity log
+        before = snapshot(comment, ("message",))
         # update the entry
         comment.message = body_data.get("message") or comment.message
+        changes = diff(before, snapshot(comment, ("message",)))
         # commit
         db.session.commit()
+        # queue the activity event with the changed fields, if any
+        if changes:
+            activity_log.record("update", "comment", comment_id, user_id=get_jwt_identity(), card_id=comment.card_id, changes=changes)
         # return the updated comment
         return comment_schema.dump(comment)
     # else:
@@ -3,6 +3,7 @@ from flask import Flask
 from marshmallow.exceptions import ValidationError
 
 from init import db, ma, bcrypt, jwt
+from activity_log import activity_log
 from controllers.cli_controllers import db_commands
 from controllers.auth_controller import auth_bp
 from controllers.card_controller import cards_bp
@@ -17,6 +18,7 @@ def create_app():
     ma.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    activity_log.init_app(app)
 
     @app.errorhandler(ValidationError)
     def validation_error(err):
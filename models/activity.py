@@ -0,0 +1,53 @@
+from init import db, ma
+
+class Activity(db.Model):
+    """
+    This class represents the Activity model in the database
+
+    Every mutation on a card, comment or user is appended here as an event.
+    Rows are never updated or deleted one by one: the table is partitioned
+    by month on created_at, and old history is removed by dropping whole
+    partitions.
+
+    Columns:
+    - id: Part of the primary key of the event
+    - created_at: When the event happened, also the partition key
+    - user_id: The user who performed the action
+    - action: One of "create", "update" or "delete"
+    - entity: One of "card", "comment" or "user"
+    - entity_id: The id of the row that was changed
+    - card_id: The card the event belongs to, if any
+    - changes: The changed fields, or a snapshot of a deleted row
+    """
+
+    __tablename__ = "activities"
+
+    # Postgres requires the partition key to be part of the primary key
+    __table_args__ = (
+        db.Index("ix_activities_card_id_created_at", "card_id", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    created_at = db.Column(db.DateTime, primary_key=True)
+
+    # No foreign keys: history must outlive the rows it describes
+    user_id = db.Column(db.Integer)
+    action = db.Column(db.String(10), nullable=False)
+    entity = db.Column(db.String(20), nullable=False)
+    entity_id = db.Column(db.Integer, nullable=False)
+    card_id = db.Column(db.Integer)
+    changes = db.Column(db.JSON)
+
+class ActivitySchema(ma.Schema):
+    """
+    This class represents the ActivitySchema in the database
+
+    This is used to serialize the Activity model into a JSON response
+    """
+
+    class Meta:
+        fields = ("id", "created_at", "user_id", "action", "entity", "entity_id", "card_id", "changes")
+
+activity_schema = ActivitySchema()
+activities_schema = ActivitySchema(many=True)